@@ -2,7 +2,16 @@
 from flask import Flask, render_template, request, jsonify, send_from_directory
 import os
 import shutil
+import glob
+import json
+import time
+import uuid
+import threading
+import atexit
+from collections import OrderedDict
 from omr_engine import OMREngine
+from work_queue import make_queue
+from results_store import ResultsStore, DEFAULT_PAGE_SIZE
 
 app = Flask(__name__)
 UPLOAD_DIR = "web_uploads"
@@ -13,6 +22,20 @@ for d in [UPLOAD_DIR, os.path.join(UPLOAD_DIR, "test"), os.path.join(UPLOAD_DIR,
     if not os.path.exists(d): os.makedirs(d)
 
 engine = None # Lazy load model
+store = ResultsStore() # Persistent history, survives /clear
+atexit.register(store.close) # Drain queued writes; clients already hold their exam_ids
+
+# Distributed mode: set OMR_QUEUE_DB (and OMR_QUEUE_BACKEND for anything but the
+# single-host "sqlite" backend) and run grading_worker.py against the same queue.
+# The web app then only enqueues sheets and aggregates results.
+QUEUE_DB = os.environ.get("OMR_QUEUE_DB")
+QUEUE_BACKEND = os.environ.get("OMR_QUEUE_BACKEND", "sqlite")
+JOB_WAIT_SECONDS = 600
+FINISHED_JOBS_KEPT = 100
+work_queue = make_queue(QUEUE_BACKEND, QUEUE_DB) if QUEUE_DB else None
+jobs = {} # job_id -> {"key_hash", "answer_path"} while workers are grading
+finished_jobs = OrderedDict() # job_id -> exam_id for recently collected jobs
+jobs_lock = threading.Lock() # /process and /jobs polls may aggregate the same job concurrently
 
 @app.route('/')
 def index():
@@ -39,9 +62,6 @@ def upload():
 @app.route('/process', methods=['POST'])
 def process():
     global engine
-    if engine is None:
-        engine = OMREngine() # Load CNN
-        
     test_dir = os.path.join(UPLOAD_DIR, "test")
     answer_files = os.listdir(os.path.join(UPLOAD_DIR, "answer"))
     if not answer_files:
@@ -49,13 +69,124 @@ def process():
         
     answer_path = os.path.join(UPLOAD_DIR, "answer", answer_files[0])
     
+    if work_queue is not None:
+        job_id = enqueue_job(test_dir, answer_path)
+        if request.args.get('wait', '1') == '0':
+            return jsonify({"status": "queued", "job_id": job_id}), 202
+        # Block until the workers finish so the dashboard works unchanged
+        deadline = time.time() + JOB_WAIT_SECONDS
+        while True:
+            job = collect_job(job_id)
+            if job is None:
+                return jsonify({"status": "error", "job_id": job_id, "message": "Job was cleared"}), 404
+            if job["status"] == "complete":
+                job["status"] = "success"
+                return jsonify(job)
+            if time.time() > deadline:
+                return jsonify({"status": "error", "job_id": job_id,
+                                "message": f"Grading timed out ({job['done']}/{job['total']} sheets done)"}), 504
+            time.sleep(0.5)
+    
+    if engine is None:
+        engine = OMREngine() # Load CNN
+        
     # Process
-    results = engine.process_all(test_dir, answer_path, OUTPUT_DIR)
+    results, key_json = engine.process_all(test_dir, answer_path, OUTPUT_DIR)
+    exam_id = store.submit(answer_path, key_json, results) # Written in background; history reads are eventually consistent
     
-    return jsonify({"status": "success", "results": results})
+    return jsonify({"status": "success", "exam_id": exam_id, "results": results})
+
+def enqueue_job(test_dir, answer_path):
+    with open(answer_path, 'rb') as fh:
+        key_hash = work_queue.publish_key(fh.read())
+    job_id = uuid.uuid4().hex
+    test_files = []
+    for ext in ["*.jpg", "*.jpeg", "*.png"]:
+        test_files.extend(glob.glob(os.path.join(test_dir, ext)))
+    for f in sorted(test_files):
+        with open(f, 'rb') as fh:
+            work_queue.enqueue(job_id, key_hash, os.path.basename(f), fh.read())
+    with jobs_lock:
+        jobs[job_id] = {"key_hash": key_hash, "answer_path": answer_path}
+    return job_id
+
+def collect_job(job_id):
+    """
+    Poll a job's progress. When it completes, its results and debug images are
+    fetched once, saved to the results store and purged from the queue.
+    Returns None for unknown jobs.
+    """
+    with jobs_lock:
+        if job_id in finished_jobs:
+            exam_id = finished_jobs[job_id]
+            return {"status": "complete", "job_id": job_id, "exam_id": exam_id, "results": None,
+                    "message": f"Results already collected; see /exams/{exam_id}/sheets"}
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        progress = work_queue.job_progress(job_id)
+        out = {"status": "running", "job_id": job_id, "exam_id": None, "results": None}
+        out.update(progress)
+        if progress["done"] + progress["failed"] < progress["total"]:
+            return out
+
+        results, debug_images = work_queue.job_results(job_id)
+        for fname, data in debug_images.items():
+            with open(os.path.join(OUTPUT_DIR, f"debug_{fname}"), 'wb') as fh:
+                fh.write(data)
+        key_blob = work_queue.get_state(job["key_hash"] + ".json")
+        key_json = json.loads(key_blob) if key_blob else {}
+        exam_id = store.submit(job["answer_path"], key_json, results)
+        work_queue.purge_job(job_id)
+        del jobs[job_id]
+        finished_jobs[job_id] = exam_id
+        while len(finished_jobs) > FINISHED_JOBS_KEPT:
+            finished_jobs.popitem(last=False)
+        out.update(status="complete", exam_id=exam_id, results=results)
+        return out
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    if work_queue is None:
+        return jsonify({"status": "error", "message": "Distributed mode is disabled"}), 400
+    job = collect_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify(job)
+
+def page_args():
+    return request.args.get('page', 1, type=int), request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+
+@app.route('/exams', methods=['GET'])
+def list_exams():
+    return jsonify(store.list_exams(*page_args()))
+
+@app.route('/exams/<exam_id>/sheets', methods=['GET'])
+def exam_sheets(exam_id):
+    return jsonify(store.exam_sheets(exam_id, *page_args()))
+
+@app.route('/exams/<exam_id>/questions/<int:question>', methods=['GET'])
+def question_responses(exam_id, question):
+    return jsonify(store.question_responses(exam_id, question, *page_args()))
+
+@app.route('/students/<student>/sheets', methods=['GET'])
+def student_sheets(student):
+    return jsonify(store.student_sheets(student, *page_args()))
+
+@app.route('/sheets/<int:sheet_id>', methods=['GET'])
+def get_sheet(sheet_id):
+    sheet = store.get_sheet(sheet_id)
+    if sheet is None:
+        return jsonify({"status": "error", "message": "Sheet not found"}), 404
+    return jsonify(sheet)
 
 @app.route('/clear', methods=['POST'])
 def clear():
+    if work_queue is not None:
+        with jobs_lock:
+            for job_id in jobs: work_queue.purge_job(job_id)
+            jobs.clear()
+            finished_jobs.clear()
     for d in [UPLOAD_DIR, OUTPUT_DIR]:
         if os.path.exists(d):
             shutil.rmtree(d)
@@ -0,0 +1,87 @@
+
+import cv2
+import numpy as np
+import json
+import os
+import socket
+import sqlite3
+import time
+import argparse
+from omr_engine import OMREngine
+from work_queue import make_queue, QUEUE_DB_PATH
+
+OUTPUT_DIR = "static/web_outputs"
+POLL_INTERVAL = 1.0
+MAX_BACKOFF = 30.0
+
+def decode_image(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+class GradingWorker:
+    """
+    Pulls sheet tasks from a WorkQueue, grades them with OMREngine and acks the result.
+    Calibrations are cached by answer key hash, so each worker calibrates a key at most once.
+    """
+    def __init__(self, queue, output_dir=OUTPUT_DIR, worker_id=None):
+        self.queue = queue
+        self.output_dir = output_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.engine = OMREngine()
+        self.calibrations = {} # key_hash -> (grid, key_json)
+        if not os.path.exists(output_dir): os.makedirs(output_dir)
+
+    def calibration_for(self, key_hash):
+        if key_hash not in self.calibrations:
+            key_bytes = self.queue.get_state(key_hash)
+            if key_bytes is None:
+                raise ValueError(f"Answer key {key_hash} not published")
+            grid, key_json = self.engine.calibrate(decode_image(key_bytes))
+            self.calibrations[key_hash] = (grid, key_json)
+            # Share the decoded key so the aggregator can store it without calibrating itself
+            if self.queue.get_state(key_hash + ".json") is None:
+                self.queue.put_state(key_hash + ".json", json.dumps(key_json).encode())
+        return self.calibrations[key_hash]
+
+    def run_once(self):
+        """Grade one task. Returns False when the queue is empty."""
+        task = self.queue.claim(self.worker_id)
+        if task is None: return False
+        try:
+            grid, key_json = self.calibration_for(task["key_hash"])
+            img = decode_image(task["image"])
+            if img is None:
+                raise ValueError(f"Could not decode {task['filename']}")
+            result = self.engine.grade_sheet(img, task["filename"], grid, key_json, self.output_dir)
+            # Ship the debug image back; the web app may be on another host
+            with open(os.path.join(self.output_dir, f"debug_{task['filename']}"), 'rb') as fh:
+                debug_image = fh.read()
+        except Exception as e:
+            acked = self.queue.fail(task["task_id"], self.worker_id, e)
+        else:
+            acked = self.queue.ack(task["task_id"], self.worker_id, result, debug_image)
+        if not acked:
+            print(f"Worker {self.worker_id}: lease lost on {task['filename']}, result discarded")
+        return True
+
+    def run(self, poll_interval=POLL_INTERVAL):
+        print(f"Worker {self.worker_id} polling for sheets...")
+        backoff = poll_interval
+        while True:
+            try:
+                busy = self.run_once()
+            except sqlite3.OperationalError as e: # e.g. "database is locked" under contention
+                print(f"Worker {self.worker_id}: queue unavailable ({e}), retrying in {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+            backoff = poll_interval
+            if not busy:
+                time.sleep(poll_interval)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="OMR grading worker")
+    parser.add_argument("--backend", default="sqlite", help="Queue backend: 'sqlite' or module:ClassName")
+    parser.add_argument("--db", default=QUEUE_DB_PATH, help="Queue location (a file path for sqlite)")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Scratch directory for debug images")
+    args = parser.parse_args()
+    GradingWorker(make_queue(args.backend, args.db), args.output).run()
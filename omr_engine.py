@@ -70,11 +70,9 @@ class OMREngine:
                 total_score += 1
         return total_score
 
-    def process_all(self, test_dir, answer_path, output_dir):
-        if not os.path.exists(output_dir): os.makedirs(output_dir)
-        
+    def calibrate(self, key_img):
+        """Learn the grid from the answer key image and read the key. Returns (grid, key_json)."""
         # 1. Calibrate Template
-        key_img = cv2.imread(answer_path)
         key_bubbles_cv = ImageProcessor.detect_filled_bubbles(key_img)
         self.template.calibrate(key_bubbles_cv)
         grid = self.template.generate_grid()
@@ -83,6 +81,55 @@ class OMREngine:
         k_bubbles_reg = ImageProcessor.detect_filled_bubbles(key_img)
         ksx, ksy = Evaluator.register_scan(k_bubbles_reg, grid)
         key_json, _ = self.scan_sheet(key_img, grid, (ksx, ksy))
+        return grid, key_json
+
+    def grade_sheet(self, img, fname, grid, key_json, output_dir):
+        """Scan and score a single test sheet against a calibrated grid and key."""
+        bubbles_cv = ImageProcessor.detect_filled_bubbles(img)
+        sx, sy = Evaluator.register_scan(bubbles_cv, grid)
+        
+        student_json, b_locs = self.scan_sheet(img, grid, (sx, sy))
+        
+        # Step 3: Run Scoring Comparison
+        score = self.calculate_score(student_json, key_json)
+        acc = (score / 150) * 100
+        
+        # Map status for Web UI compatibility
+        details = {}
+        correct_count, wrong_count, invalid_count, blank_count = 0, 0, 0, 0
+        
+        for q in range(1, 151):
+            q_key = f"{q:03d}"
+            s_val = student_json[q_key]
+            k_val = key_json[q_key]
+            
+            status = "WRONG"
+            if s_val is None: 
+                status = "BLANK"; blank_count += 1
+            elif s_val == 0: 
+                status = "INVALID"; invalid_count += 1
+            elif s_val == k_val: 
+                status = "CORRECT"; correct_count += 1
+            else: 
+                wrong_count += 1
+            details[q] = status
+
+        self.save_debug(img, fname, grid, b_locs, (sx, sy), details, output_dir)
+        
+        return {
+            "filename": fname,
+            "score": score,
+            "accuracy": f"{acc:.1f}%",
+            "stats": [correct_count, wrong_count, invalid_count, blank_count],
+            "details": details,
+            "full_json": student_json
+        }
+
+    def process_all(self, test_dir, answer_path, output_dir):
+        """Grade every sheet in test_dir. Returns (results, key_json)."""
+        if not os.path.exists(output_dir): os.makedirs(output_dir)
+        
+        grid, key_json = self.calibrate(cv2.imread(answer_path))
         
         # 3. Process Test Sheets (Step 2)
         test_files = []
@@ -91,50 +138,9 @@ class OMREngine:
         
         results = []
         for f in sorted(test_files):
-            fname = os.path.basename(f)
-            img = cv2.imread(f)
-            
-            bubbles_cv = ImageProcessor.detect_filled_bubbles(img)
-            sx, sy = Evaluator.register_scan(bubbles_cv, grid)
-            
-            student_json, b_locs = self.scan_sheet(img, grid, (sx, sy))
-            
-            # Step 3: Run Scoring Comparison
-            score = self.calculate_score(student_json, key_json)
-            acc = (score / 150) * 100
-            
-            # Map status for Web UI compatibility
-            details = {}
-            correct_count, wrong_count, invalid_count, blank_count = 0, 0, 0, 0
-            
-            for q in range(1, 151):
-                q_key = f"{q:03d}"
-                s_val = student_json[q_key]
-                k_val = key_json[q_key]
-                
-                status = "WRONG"
-                if s_val is None: 
-                    status = "BLANK"; blank_count += 1
-                elif s_val == 0: 
-                    status = "INVALID"; invalid_count += 1
-                elif s_val == k_val: 
-                    status = "CORRECT"; correct_count += 1
-                else: 
-                    wrong_count += 1
-                details[q] = status
-
-            self.save_debug(img, fname, grid, b_locs, (sx, sy), details, output_dir)
-            
-            results.append({
-                "filename": fname,
-                "score": score,
-                "accuracy": f"{acc:.1f}%",
-                "stats": [correct_count, wrong_count, invalid_count, blank_count],
-                "details": details,
-                "full_json": student_json
-            })
+            results.append(self.grade_sheet(cv2.imread(f), os.path.basename(f), grid, key_json, output_dir))
             
-        return results
+        return results, key_json
 
     def save_debug(self, img, fname, grid, bubble_map, shift, details, out_dir):
         vis = img.copy()
@@ -0,0 +1,175 @@
+
+import sqlite3
+import threading
+import queue
+import uuid
+import time
+import os
+
+DB_PATH = "results.db"
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exams (
+    exam_id     TEXT PRIMARY KEY,
+    answer_file TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    sheet_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS keys (
+    exam_id  TEXT NOT NULL REFERENCES exams(exam_id),
+    question INTEGER NOT NULL,
+    answer   INTEGER,
+    PRIMARY KEY (exam_id, question)
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    sheet_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    exam_id  TEXT NOT NULL REFERENCES exams(exam_id),
+    student  TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    score    INTEGER NOT NULL,
+    accuracy TEXT NOT NULL,
+    correct  INTEGER NOT NULL,
+    wrong    INTEGER NOT NULL,
+    invalid  INTEGER NOT NULL,
+    blank    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS responses (
+    sheet_id INTEGER NOT NULL REFERENCES sheets(sheet_id),
+    question INTEGER NOT NULL,
+    answer   INTEGER,
+    status   TEXT NOT NULL,
+    PRIMARY KEY (sheet_id, question)
+);
+CREATE INDEX IF NOT EXISTS idx_sheets_student ON sheets(student);
+CREATE INDEX IF NOT EXISTS idx_sheets_exam ON sheets(exam_id);
+CREATE INDEX IF NOT EXISTS idx_responses_question ON responses(question, status);
+"""
+
+class ResultsStore:
+    """
+    Persistent SQLite store for graded exams.
+    All writes go through a single background thread fed by a queue, so
+    grading never waits on disk; each job is committed in one transaction.
+    """
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.jobs = queue.Queue()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # ------------------------------------------
+    # Writes (queued, single writer)
+    # ------------------------------------------
+    def submit(self, answer_path, key_json, results):
+        """
+        Queue a finished grading job. Returns the exam_id immediately;
+        reads are eventually consistent, so the exam may not be visible until
+        the writer thread commits it (call flush() to wait).
+        """
+        exam_id = uuid.uuid4().hex
+        self.jobs.put((exam_id, os.path.basename(answer_path), key_json, results, time.time()))
+        return exam_id
+
+    def flush(self):
+        """Block until every queued job has been written."""
+        self.jobs.join()
+
+    def close(self):
+        """Write everything still queued, then stop the writer thread."""
+        self.jobs.put(None)
+        self.writer.join()
+
+    def _writer_loop(self):
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None: break
+                self._write_job(conn, *job)
+            except Exception as e: # Never let one bad job kill the only writer
+                print(f"ResultsStore: failed to write exam {job[0]}: {e!r}")
+            finally:
+                self.jobs.task_done()
+        conn.close()
+
+    def _write_job(self, conn, exam_id, answer_file, key_json, results, created_at):
+        with conn: # One transaction per job
+            conn.execute(
+                "INSERT INTO exams (exam_id, answer_file, created_at, sheet_count) VALUES (?, ?, ?, ?)",
+                (exam_id, answer_file, created_at, len(results)))
+            conn.executemany(
+                "INSERT INTO keys (exam_id, question, answer) VALUES (?, ?, ?)",
+                [(exam_id, int(q), a) for q, a in key_json.items()])
+            for r in results:
+                # The engine does not read a roll number, so the sheet's filename stem identifies the student
+                correct, wrong, invalid, blank = r["stats"]
+                cur = conn.execute(
+                    "INSERT INTO sheets (exam_id, student, filename, score, accuracy, correct, wrong, invalid, blank) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (exam_id, os.path.splitext(r["filename"])[0], r["filename"], r["score"], r["accuracy"],
+                     correct, wrong, invalid, blank))
+                sheet_id = cur.lastrowid
+                details = {int(q): status for q, status in r["details"].items()} # JSON round-trips make keys str
+                conn.executemany(
+                    "INSERT INTO responses (sheet_id, question, answer, status) VALUES (?, ?, ?, ?)",
+                    [(sheet_id, int(q_key), a, details[int(q_key)]) for q_key, a in r["full_json"].items()])
+
+    # ------------------------------------------
+    # Reads (paginated)
+    # ------------------------------------------
+    def _page(self, sql, count_sql, args, page, per_page):
+        page = max(1, int(page))
+        per_page = min(max(1, int(per_page)), MAX_PAGE_SIZE)
+        conn = self._connect()
+        try:
+            total = conn.execute(count_sql, args).fetchone()[0]
+            rows = conn.execute(sql + " LIMIT ? OFFSET ?", args + (per_page, (page - 1) * per_page)).fetchall()
+        finally:
+            conn.close()
+        return {"page": page, "per_page": per_page, "total": total, "items": [dict(r) for r in rows]}
+
+    def list_exams(self, page=1, per_page=DEFAULT_PAGE_SIZE):
+        return self._page("SELECT * FROM exams ORDER BY created_at DESC",
+                          "SELECT COUNT(*) FROM exams", (), page, per_page)
+
+    def exam_sheets(self, exam_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+        return self._page("SELECT * FROM sheets WHERE exam_id = ? ORDER BY sheet_id",
+                          "SELECT COUNT(*) FROM sheets WHERE exam_id = ?", (exam_id,), page, per_page)
+
+    def student_sheets(self, student, page=1, per_page=DEFAULT_PAGE_SIZE):
+        return self._page("SELECT s.*, e.created_at FROM sheets s JOIN exams e ON e.exam_id = s.exam_id "
+                          "WHERE s.student = ? ORDER BY e.created_at DESC",
+                          "SELECT COUNT(*) FROM sheets WHERE student = ?", (student,), page, per_page)
+
+    def question_responses(self, exam_id, question, page=1, per_page=DEFAULT_PAGE_SIZE):
+        return self._page("SELECT s.sheet_id, s.student, r.answer, r.status FROM responses r "
+                          "JOIN sheets s ON s.sheet_id = r.sheet_id "
+                          "WHERE s.exam_id = ? AND r.question = ? ORDER BY s.sheet_id",
+                          "SELECT COUNT(*) FROM responses r JOIN sheets s ON s.sheet_id = r.sheet_id "
+                          "WHERE s.exam_id = ? AND r.question = ?", (exam_id, question), page, per_page)
+
+    def get_sheet(self, sheet_id):
+        """Single sheet with its full per-question responses, or None."""
+        conn = self._connect()
+        try:
+            sheet = conn.execute("SELECT * FROM sheets WHERE sheet_id = ?", (sheet_id,)).fetchone()
+            if sheet is None: return None
+            rows = conn.execute("SELECT question, answer, status FROM responses WHERE sheet_id = ? ORDER BY question",
+                                (sheet_id,)).fetchall()
+        finally:
+            conn.close()
+        out = dict(sheet)
+        out["responses"] = [dict(r) for r in rows]
+        return out
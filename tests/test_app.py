@@ -0,0 +1,167 @@
+import sys
+import types
+import importlib
+import threading
+import pytest
+from test_results_store import make_result, KEY
+from work_queue import WorkQueue
+
+pytest.importorskip("flask")
+
+class FakeEngine:
+    """Stands in for OMREngine so the app can be tested without cv2."""
+    def process_all(self, test_dir, answer_path, output_dir):
+        return [make_result("test 1.png"), make_result("test 2.png")], KEY
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Upload dirs and results.db are relative to cwd
+    monkeypatch.delenv("OMR_QUEUE_DB", raising=False)
+    fake_engine = types.ModuleType("omr_engine")
+    fake_engine.OMREngine = FakeEngine
+    monkeypatch.setitem(sys.modules, "omr_engine", fake_engine)
+    monkeypatch.delitem(sys.modules, "app", raising=False)
+    module = importlib.import_module("app")
+    (tmp_path / "web_uploads" / "answer" / "key.jpeg").write_bytes(b"key")
+    yield module
+    module.store.close()
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+def test_history_endpoints(app_module, client):
+    data = client.post('/process').get_json()
+    assert data["status"] == "success"
+    exam_id = data["exam_id"]
+    app_module.store.flush()
+
+    exams = client.get('/exams').get_json()
+    assert [e["exam_id"] for e in exams["items"]] == [exam_id]
+
+    sheets = client.get(f'/exams/{exam_id}/sheets?page=2&per_page=1').get_json()
+    assert (sheets["total"], sheets["page"], sheets["per_page"]) == (2, 2, 1)
+    assert sheets["items"][0]["student"] == "test 2"
+
+    # Non-numeric page args fall back to the defaults
+    sheets = client.get(f'/exams/{exam_id}/sheets?page=abc').get_json()
+    assert (sheets["page"], len(sheets["items"])) == (1, 2)
+
+    answers = client.get(f'/exams/{exam_id}/questions/2').get_json()
+    assert [a["status"] for a in answers["items"]] == ["WRONG", "WRONG"]
+
+    history = client.get('/students/test 1/sheets').get_json()
+    assert history["total"] == 1
+    sheet_id = history["items"][0]["sheet_id"]
+
+    sheet = client.get(f'/sheets/{sheet_id}').get_json()
+    assert len(sheet["responses"]) == 150
+    assert client.get('/sheets/9999').status_code == 404
+
+class FakeQueue(WorkQueue):
+    """In-memory WorkQueue; finish() plays the part of the workers."""
+    def __init__(self):
+        self.state, self.tasks = {}, {}
+        self.results_calls, self.purged = 0, []
+        self.finish_on_poll = False
+
+    def put_state(self, key, blob):
+        self.state[key] = blob
+
+    def get_state(self, key):
+        return self.state.get(key)
+
+    def enqueue(self, job_id, key_hash, filename, image_bytes):
+        self.tasks.setdefault(job_id, {})[filename] = None
+
+    def claim(self, worker_id):
+        return None
+
+    def ack(self, task_id, worker_id, result, debug_image=None):
+        return False
+
+    def fail(self, task_id, worker_id, error):
+        return False
+
+    def finish(self, job_id):
+        for fname in self.tasks[job_id]:
+            self.tasks[job_id][fname] = make_result(fname)
+
+    def job_progress(self, job_id):
+        if self.finish_on_poll: self.finish(job_id)
+        tasks = self.tasks.get(job_id, {})
+        done = sum(1 for r in tasks.values() if r is not None)
+        return {"total": len(tasks), "done": done, "failed": 0, "errors": {}}
+
+    def job_results(self, job_id):
+        self.results_calls += 1
+        results = list(self.tasks[job_id].values())
+        return results, {r["filename"]: b"png" for r in results}
+
+    def purge_job(self, job_id):
+        self.purged.append(job_id)
+        self.tasks.pop(job_id, None)
+
+@pytest.fixture
+def fake_queue(app_module, tmp_path, monkeypatch):
+    wq = FakeQueue()
+    wq.put_state(wq.publish_key(b"key") + ".json", b'{"001": 1}') # As a worker would after calibrating
+    monkeypatch.setattr(app_module, "work_queue", wq)
+    for name in ("test 1.png", "test 2.png"):
+        (tmp_path / "web_uploads" / "test" / name).write_bytes(b"img")
+    return wq
+
+def test_queued_job_is_collected_once(app_module, client, fake_queue, tmp_path):
+    resp = client.post('/process?wait=0')
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+
+    running = client.get(f'/jobs/{job_id}').get_json()
+    assert (running["status"], running["total"], running["done"], running["results"]) == ("running", 2, 0, None)
+    assert fake_queue.results_calls == 0 # Progress polls never fetch results
+
+    fake_queue.finish(job_id)
+    done = client.get(f'/jobs/{job_id}').get_json()
+    assert done["status"] == "complete"
+    assert [r["filename"] for r in done["results"]] == ["test 1.png", "test 2.png"]
+    assert (tmp_path / "static" / "web_outputs" / "debug_test 1.png").read_bytes() == b"png"
+    assert fake_queue.purged == [job_id]
+    assert job_id not in app_module.jobs
+
+    again = client.get(f'/jobs/{job_id}').get_json()
+    assert (again["status"], again["exam_id"], again["results"]) == ("complete", done["exam_id"], None)
+    assert fake_queue.results_calls == 1
+    app_module.store.flush()
+    assert app_module.store.list_exams()["total"] == 1
+
+def test_concurrent_collection_stores_exam_once(app_module, fake_queue):
+    job_id = app_module.enqueue_job("web_uploads/test", "web_uploads/answer/key.jpeg")
+    fake_queue.finish(job_id)
+    threads = [threading.Thread(target=app_module.collect_job, args=(job_id,)) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    app_module.store.flush()
+    assert fake_queue.results_calls == 1
+    assert app_module.store.list_exams()["total"] == 1
+
+def test_blocking_process_returns_success(client, fake_queue):
+    fake_queue.finish_on_poll = True
+    data = client.post('/process').get_json()
+    assert data["status"] == "success" # What the dashboard checks for
+    assert len(data["results"]) == 2
+
+def test_blocking_process_times_out(app_module, client, fake_queue, monkeypatch):
+    monkeypatch.setattr(app_module, "JOB_WAIT_SECONDS", 0)
+    resp = client.post('/process')
+    assert resp.status_code == 504
+    assert resp.get_json()["status"] == "error"
+
+def test_unknown_job_is_404(client, fake_queue):
+    assert client.get('/jobs/nope').status_code == 404
+
+def test_clear_purges_queued_jobs(app_module, client, fake_queue):
+    job_id = client.post('/process?wait=0').get_json()["job_id"]
+    client.post('/clear')
+    assert fake_queue.purged == [job_id]
+    assert app_module.jobs == {}
+    assert client.get(f'/jobs/{job_id}').status_code == 404
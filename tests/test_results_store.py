@@ -0,0 +1,57 @@
+import pytest
+from results_store import ResultsStore, MAX_PAGE_SIZE
+
+def make_result(fname, str_keys=False):
+    details = {q: "CORRECT" if q % 2 else "WRONG" for q in range(1, 151)}
+    if str_keys: # As they arrive after a JSON round-trip
+        details = {str(q): s for q, s in details.items()}
+    return {
+        "filename": fname,
+        "score": 75,
+        "accuracy": "50.0%",
+        "stats": [75, 75, 0, 0],
+        "details": details,
+        "full_json": {f"{q:03d}": 1 for q in range(1, 151)},
+    }
+
+KEY = {f"{q:03d}": 1 for q in range(1, 151)}
+
+@pytest.fixture
+def store(tmp_path):
+    s = ResultsStore(str(tmp_path / "results.db"))
+    yield s
+    s.close()
+
+def test_job_is_one_transaction_and_writer_survives_bad_job(store):
+    bad = make_result("b.png")
+    del bad["stats"]
+    bad_id = store.submit("key.jpeg", KEY, [make_result("a.png"), bad])
+    good_id = store.submit("key.jpeg", KEY, [make_result("c.png")])
+    store.flush()
+    # The failed job leaves nothing behind, and the writer keeps going
+    assert store.exam_sheets(bad_id)["total"] == 0
+    assert [e["exam_id"] for e in store.list_exams()["items"]] == [good_id]
+    assert store.exam_sheets(good_id)["total"] == 1
+
+def test_str_detail_keys_round_trip(store):
+    exam_id = store.submit("key.jpeg", KEY, [make_result("a.png", str_keys=True)])
+    store.flush()
+    sheet_id = store.exam_sheets(exam_id)["items"][0]["sheet_id"]
+    sheet = store.get_sheet(sheet_id)
+    assert sheet["student"] == "a"
+    assert len(sheet["responses"]) == 150
+    assert sheet["responses"][0] == {"question": 1, "answer": 1, "status": "CORRECT"}
+    assert store.question_responses(exam_id, 2)["items"][0]["status"] == "WRONG"
+
+def test_pagination_is_clamped(store):
+    exam_id = store.submit("key.jpeg", KEY, [make_result(f"s{i}.png") for i in range(5)])
+    store.flush()
+    page = store.exam_sheets(exam_id, page=2, per_page=2)
+    assert (page["total"], len(page["items"])) == (5, 2)
+    assert page["items"][0]["filename"] == "s2.png"
+    page = store.exam_sheets(exam_id, page=0, per_page=10000)
+    assert (page["page"], page["per_page"], len(page["items"])) == (1, MAX_PAGE_SIZE, 5)
+    assert store.exam_sheets(exam_id, per_page=-3)["per_page"] == 1
+
+def test_missing_sheet_is_none(store):
+    assert store.get_sheet(12345) is None
@@ -0,0 +1,182 @@
+import os
+import sys
+import sqlite3
+import types
+import importlib
+import pytest
+from work_queue import WorkQueue, SQLiteWorkQueue, make_queue
+
+@pytest.fixture
+def wq(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, max_attempts=2)
+
+@pytest.fixture
+def grading_worker(monkeypatch):
+    """grading_worker imported with the engine (and cv2/numpy, if missing) stubbed out."""
+    for name in ("cv2", "numpy"):
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    fake_engine = types.ModuleType("omr_engine")
+    fake_engine.OMREngine = lambda: types.SimpleNamespace()
+    monkeypatch.setitem(sys.modules, "omr_engine", fake_engine)
+    monkeypatch.delitem(sys.modules, "grading_worker", raising=False)
+    module = importlib.import_module("grading_worker")
+    monkeypatch.setattr(module, "decode_image", lambda data: data)
+    return module
+
+def expire_leases(wq):
+    wq.lease_seconds = -1 # Leases granted from now on are already expired
+
+def test_incomplete_backend_cannot_be_created():
+    class Partial(WorkQueue):
+        def put_state(self, key, blob): pass
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_claim_and_ack(wq):
+    key_hash = wq.publish_key(b"key")
+    assert wq.publish_key(b"key") == key_hash
+    wq.enqueue("job", key_hash, "a.png", b"img")
+    task = wq.claim("w1")
+    assert (task["filename"], task["image"], task["attempts"]) == ("a.png", b"img", 1)
+    assert wq.claim("w2") is None # Leased to w1
+    assert wq.ack(task["task_id"], "w1", {"filename": "a.png"}, b"debug")
+    progress = wq.job_progress("job")
+    assert (progress["total"], progress["done"], progress["failed"]) == (1, 1, 0)
+    assert wq.job_results("job") == ([{"filename": "a.png"}], {"a.png": b"debug"})
+
+def test_retry_until_max_attempts_then_failed(wq):
+    wq.enqueue("job", "h", "a.png", b"img")
+    task = wq.claim("w1")
+    assert wq.fail(task["task_id"], "w1", "boom")
+    task = wq.claim("w1") # Back in the queue for a second attempt
+    assert task["attempts"] == 2
+    assert wq.fail(task["task_id"], "w1", "boom again")
+    assert wq.claim("w1") is None
+    progress = wq.job_progress("job")
+    assert (progress["done"], progress["failed"]) == (0, 1)
+    assert progress["errors"] == {"a.png": "boom again"}
+
+def test_expired_lease_is_reclaimed(wq):
+    wq.enqueue("job", "h", "a.png", b"img")
+    expire_leases(wq)
+    first = wq.claim("w1")
+    second = wq.claim("w2")
+    assert second["task_id"] == first["task_id"]
+    assert second["attempts"] == 2
+
+def test_expired_lease_past_max_attempts_fails(wq):
+    wq.enqueue("job", "h", "a.png", b"img")
+    expire_leases(wq)
+    wq.claim("w1")
+    wq.claim("w2") # Second and last attempt also hangs
+    assert wq.claim("w3") is None
+    progress = wq.job_progress("job")
+    assert progress["failed"] == 1
+    assert "Lease expired" in progress["errors"]["a.png"]
+
+def test_stale_worker_cannot_ack_or_fail(wq):
+    wq.enqueue("job", "h", "a.png", b"img")
+    expire_leases(wq)
+    task = wq.claim("w1")
+    wq.lease_seconds = 60
+    assert wq.claim("w2")["task_id"] == task["task_id"]
+    assert wq.ack(task["task_id"], "w2", {"filename": "a.png"})
+    # w1 wakes up late: neither call may touch w2's finished task
+    assert not wq.fail(task["task_id"], "w1", "timeout")
+    assert not wq.ack(task["task_id"], "w1", {"filename": "stale"})
+    assert wq.job_progress("job")["done"] == 1
+    assert wq.job_results("job")[0] == [{"filename": "a.png"}]
+
+def test_progress_results_and_purge(wq):
+    for name in ("a.png", "b.png"):
+        wq.enqueue("job", "h", name, b"img")
+    wq.enqueue("other", "h", "c.png", b"img")
+    task = wq.claim("w1")
+    wq.ack(task["task_id"], "w1", {"filename": task["filename"]}, b"debug")
+    assert wq.job_progress("job") == {"total": 2, "done": 1, "failed": 0, "errors": {}}
+    assert wq.job_results("job") == ([{"filename": "a.png"}], {"a.png": b"debug"})
+    wq.purge_job("job")
+    assert wq.job_progress("job")["total"] == 0
+    assert wq.job_progress("other")["total"] == 1
+
+def test_make_queue(tmp_path):
+    assert isinstance(make_queue("sqlite", str(tmp_path / "a.db")), SQLiteWorkQueue)
+    assert isinstance(make_queue("work_queue:SQLiteWorkQueue", str(tmp_path / "b.db")), SQLiteWorkQueue)
+    with pytest.raises(ValueError):
+        make_queue("redis", "localhost")
+    with pytest.raises(TypeError):
+        make_queue("collections:OrderedDict", "x")
+
+def test_claim_lock_timeout_raises_real_error(tmp_path):
+    class QuickQueue(SQLiteWorkQueue):
+        def _connect(self):
+            conn = sqlite3.connect(self.db_path, timeout=0.05, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            return conn
+    wq = QuickQueue(str(tmp_path / "queue.db"))
+    holder = sqlite3.connect(wq.db_path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="locked"):
+            wq.claim("w1")
+    finally:
+        holder.execute("ROLLBACK")
+        holder.close()
+
+def test_worker_calibrates_once_per_key(wq, tmp_path, grading_worker):
+    worker = grading_worker.GradingWorker(wq, output_dir=str(tmp_path / "out"), worker_id="w1")
+    calibrated = []
+    def fake_calibrate(img):
+        calibrated.append(img)
+        return {}, {"001": 1}
+    def fake_grade(img, fname, grid, key_json, output_dir):
+        with open(os.path.join(output_dir, f"debug_{fname}"), 'wb') as fh:
+            fh.write(b"png")
+        return {"filename": fname}
+    worker.engine.calibrate = fake_calibrate
+    worker.engine.grade_sheet = fake_grade
+
+    key_a, key_b = wq.publish_key(b"key-a"), wq.publish_key(b"key-b")
+    for i in range(3):
+        wq.enqueue("job", key_a, f"a{i}.png", b"img")
+    wq.enqueue("job", key_b, "b.png", b"img")
+    while worker.run_once():
+        pass
+
+    assert calibrated == [b"key-a", b"key-b"]
+    assert wq.get_state(key_a + ".json") == b'{"001": 1}'
+    assert wq.job_progress("job")["done"] == 4
+    assert wq.job_results("job")[1]["b.png"] == b"png"
+
+def test_worker_failure_is_reported_to_queue(wq, tmp_path, grading_worker):
+    worker = grading_worker.GradingWorker(wq, output_dir=str(tmp_path / "out"), worker_id="w1")
+    worker.engine.calibrate = lambda img: ({}, {})
+    def broken_grade(*args):
+        raise RuntimeError("bad scan")
+    worker.engine.grade_sheet = broken_grade
+    wq.enqueue("job", wq.publish_key(b"key"), "a.png", b"img")
+    while worker.run_once():
+        pass
+    assert wq.job_progress("job")["errors"] == {"a.png": "bad scan"}
+
+def test_worker_backs_off_when_queue_is_locked(tmp_path, grading_worker, monkeypatch):
+    class LockedQueue:
+        calls = 0
+        def claim(self, worker_id):
+            LockedQueue.calls += 1
+            if LockedQueue.calls <= 3:
+                raise sqlite3.OperationalError("database is locked")
+            return None
+    sleeps = []
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 4:
+            raise KeyboardInterrupt # Stop the otherwise endless loop
+    monkeypatch.setattr(grading_worker.time, "sleep", fake_sleep)
+    worker = grading_worker.GradingWorker(LockedQueue(), output_dir=str(tmp_path / "out"), worker_id="w1")
+    with pytest.raises(KeyboardInterrupt):
+        worker.run(poll_interval=1.0)
+    assert sleeps == [1.0, 2.0, 4.0, 1.0] # Exponential backoff, reset once the queue answers
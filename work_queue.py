@@ -0,0 +1,238 @@
+
+import sqlite3
+import hashlib
+from abc import ABC, abstractmethod
+import importlib
+import json
+import uuid
+import time
+
+QUEUE_DB_PATH = "queue.db"
+LEASE_SECONDS = 120 # A claimed task returns to the queue if not acked in time
+MAX_ATTEMPTS = 3
+
+class WorkQueue(ABC):
+    """
+    Backend interface for distributing sheet grading across hosts.
+    Tasks carry the raw sheet image plus the hash of the answer key they are
+    graded against; the key itself is stored once as shared state under that hash.
+    A backend (Redis, SQS, a shared database...) only needs to implement these methods.
+    """
+    @abstractmethod
+    def put_state(self, key, blob):
+        """Store shared state (answer keys, decoded key JSON) under a key."""
+
+    @abstractmethod
+    def get_state(self, key):
+        """Returns the stored blob, or None."""
+
+    @abstractmethod
+    def enqueue(self, job_id, key_hash, filename, image_bytes):
+        """Add one sheet to a job. Returns the task_id."""
+
+    @abstractmethod
+    def claim(self, worker_id):
+        """Lease the next pending task. Returns a dict or None when the queue is empty."""
+
+    @abstractmethod
+    def ack(self, task_id, worker_id, result, debug_image=None):
+        """Mark a task done. Returns False if worker_id no longer holds the lease."""
+
+    @abstractmethod
+    def fail(self, task_id, worker_id, error):
+        """Return a task for retry (or park it as failed). Returns False on a lost lease."""
+
+    @abstractmethod
+    def job_progress(self, job_id):
+        """Cheap progress poll. Returns {"total", "done", "failed", "errors"} for a job."""
+
+    @abstractmethod
+    def job_results(self, job_id):
+        """Returns (results, debug_images) for a job's finished tasks; call once when the job is complete."""
+
+    @abstractmethod
+    def purge_job(self, job_id):
+        """Delete every task of a job once its results have been collected."""
+
+    def publish_key(self, key_bytes):
+        """Store the answer key image once and return its content hash."""
+        key_hash = hashlib.sha256(key_bytes).hexdigest()
+        if self.get_state(key_hash) is None:
+            self.put_state(key_hash, key_bytes)
+        return key_hash
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Local backend on a single SQLite file, for testing and for several worker
+    processes on one machine. Not for multiple hosts: WAL mode needs shared
+    memory, so the file must not live on a network filesystem.
+    """
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS state (
+        key  TEXT PRIMARY KEY,
+        blob BLOB NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tasks (
+        task_id     TEXT PRIMARY KEY,
+        job_id      TEXT NOT NULL,
+        key_hash    TEXT NOT NULL,
+        filename    TEXT NOT NULL,
+        image       BLOB NOT NULL,
+        status      TEXT NOT NULL DEFAULT 'pending',
+        attempts    INTEGER NOT NULL DEFAULT 0,
+        worker_id   TEXT,
+        lease_until REAL,
+        result      TEXT,
+        debug_image BLOB,
+        error       TEXT,
+        created_at  REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, created_at);
+    CREATE INDEX IF NOT EXISTS idx_tasks_job ON tasks(job_id);
+    """
+
+    def __init__(self, db_path=QUEUE_DB_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        conn.close()
+
+    def _connect(self):
+        # Autocommit mode so claim() can take the write lock up front with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def put_state(self, key, blob):
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO state (key, blob) VALUES (?, ?)", (key, blob))
+        finally:
+            conn.close()
+
+    def get_state(self, key):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT blob FROM state WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else bytes(row["blob"])
+
+    def enqueue(self, job_id, key_hash, filename, image_bytes):
+        task_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute("INSERT INTO tasks (task_id, job_id, key_hash, filename, image, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                         (task_id, job_id, key_hash, filename, image_bytes, time.time()))
+        finally:
+            conn.close()
+        return task_id
+
+    def claim(self, worker_id):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Tasks that keep crashing or hanging their worker never reach fail(); give up on them here
+            conn.execute("UPDATE tasks SET status = 'failed', lease_until = NULL, "
+                         "error = 'Lease expired after ' || attempts || ' attempts' "
+                         "WHERE status = 'running' AND lease_until < ? AND attempts >= ?", (now, self.max_attempts))
+            # Pending tasks, or running tasks whose worker died before acking
+            row = conn.execute(
+                "SELECT task_id, job_id, key_hash, filename, image, attempts FROM tasks "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE tasks SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1 "
+                         "WHERE task_id = ?", (worker_id, now + self.lease_seconds, row["task_id"]))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            # BEGIN IMMEDIATE itself may have timed out, leaving nothing to roll back
+            if conn.in_transaction: conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        task = dict(row)
+        task["image"] = bytes(task["image"])
+        task["attempts"] += 1
+        return task
+
+    def ack(self, task_id, worker_id, result, debug_image=None):
+        conn = self._connect()
+        try:
+            cur = conn.execute("UPDATE tasks SET status = 'done', result = ?, debug_image = ?, image = x'', lease_until = NULL "
+                               "WHERE task_id = ? AND worker_id = ? AND status = 'running'",
+                               (json.dumps(result), debug_image, task_id, worker_id))
+        finally:
+            conn.close()
+        return cur.rowcount > 0
+
+    def fail(self, task_id, worker_id, error):
+        conn = self._connect()
+        try:
+            # Retry until max_attempts, then park as failed
+            cur = conn.execute("UPDATE tasks SET error = ?, lease_until = NULL, "
+                               "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                               "WHERE task_id = ? AND worker_id = ? AND status = 'running'",
+                               (str(error), self.max_attempts, task_id, worker_id))
+        finally:
+            conn.close()
+        return cur.rowcount > 0
+
+    def job_progress(self, job_id):
+        conn = self._connect()
+        try:
+            counts = conn.execute("SELECT COUNT(*), "
+                                  "COALESCE(SUM(status = 'done'), 0), COALESCE(SUM(status = 'failed'), 0) "
+                                  "FROM tasks WHERE job_id = ?", (job_id,)).fetchone()
+            errors = conn.execute("SELECT filename, error FROM tasks WHERE job_id = ? AND status = 'failed'",
+                                  (job_id,)).fetchall()
+        finally:
+            conn.close()
+        return {
+            "total": counts[0],
+            "done": counts[1],
+            "failed": counts[2],
+            "errors": {r["filename"]: r["error"] for r in errors},
+        }
+
+    def job_results(self, job_id):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT filename, result, debug_image FROM tasks "
+                                "WHERE job_id = ? AND status = 'done' ORDER BY filename", (job_id,)).fetchall()
+        finally:
+            conn.close()
+        results = [json.loads(r["result"]) for r in rows]
+        debug_images = {r["filename"]: bytes(r["debug_image"]) for r in rows if r["debug_image"] is not None}
+        return results, debug_images
+
+    def purge_job(self, job_id):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM tasks WHERE job_id = ?", (job_id,))
+        finally:
+            conn.close()
+
+QUEUE_BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+def make_queue(backend, location):
+    """
+    Build a WorkQueue from a registered backend name ("sqlite") or a
+    "module:ClassName" path to a WorkQueue subclass taking one location argument.
+    """
+    if backend in QUEUE_BACKENDS:
+        cls = QUEUE_BACKENDS[backend]
+    else:
+        module_name, _, class_name = backend.partition(":")
+        if not class_name:
+            raise ValueError(f"Unknown queue backend '{backend}'")
+        cls = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(cls, type) and issubclass(cls, WorkQueue)):
+        raise TypeError(f"{backend} is not a WorkQueue")
+    return cls(location)